@@ -857,6 +857,9 @@ class SampleCollection(BaseCollection):
             raise LoggedError(self.log, "Collection is empty. Cannot compute cov.")
         weights_cov, are_int = self._weights_for_stats(
             first, last, weights=weights, tempered=tempered)
+        if are_int:
+            # may be integer only up to rounding, e.g. after uniform importance weights
+            weights_cov = np.round(weights_cov).astype(int)
         weight_type_kwarg = "fweights" if are_int else "aweights"
         return np.atleast_2d(np.cov(  # type: ignore
             self[list(self.sampled_params) +
@@ -1,10 +1,15 @@
 # Global
 import hashlib
+import json
+import mmap
 import os
 import pickle
-from itertools import chain
+from itertools import chain, takewhile
 import numpy as np
+import pandas as pd
 import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Optional, List, Dict, FrozenSet, NamedTuple
 
 # Local
@@ -15,7 +20,9 @@ from cobaya.input import update_info
 from cobaya.log import LoggedError, get_logger, is_debug
 from cobaya.typing import empty_dict
 
-_covmats_file = "covmat_%s.pkl"
+_covmats_file = "covmat_v3_%s.pkl"
+
+_max_header_read_threads = 32
 
 log = get_logger(__name__)
 
@@ -37,6 +44,29 @@ def covmat_file_key(paramtags, datatags, base):
 # Global instance of loaded database, for fast calls to get_best_covmat in GUI
 _loaded_covmats_database: Dict[str, Dict[CovmatFileKey, dict]] = {}
 
+# Recently updated infos, for repeated calls to get_best_covmat in GUI
+_updated_infos: Dict[str, dict] = {}
+_max_updated_infos = 8
+
+
+def _update_info_cached(info) -> dict:
+    """
+    Returns ``update_info(info, strict=False)``, reusing the result of previous calls
+    with an identical ``info``. The returned dict is a shallow copy.
+    """
+    try:
+        info_key = json.dumps(
+            info, sort_keys=True,
+            default=lambda x: x.tolist() if isinstance(x, np.ndarray) else repr(x))
+    except TypeError:  # e.g. non-sortable keys: do not cache
+        return update_info(info, strict=False)
+    if (updated_info := _updated_infos.get(info_key)) is None:
+        updated_info = update_info(info, strict=False)
+        if len(_updated_infos) >= _max_updated_infos:
+            _updated_infos.pop(next(iter(_updated_infos)))
+        _updated_infos[info_key] = updated_info
+    return dict(updated_info)
+
 
 def get_covmat_package_folders(packages_path) -> List[str]:
     install_folders = []
@@ -48,23 +78,65 @@ def get_covmat_package_folders(packages_path) -> List[str]:
     return install_folders
 
 
+def _read_covmat_header_params(path) -> Optional[List[str]]:
+    """
+    Returns the list of parameter names in the header line of a covmat file,
+    or None if it cannot be read or has no valid header.
+
+    Uses unbuffered reads of the first bytes, since only the header is needed.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            header = os.read(fd, 1024)
+            while b"\n" not in header and (more := os.read(fd, 4096)):
+                header += more
+        finally:
+            os.close(fd)
+        header = header.split(b"\n", 1)[0].decode("utf-8-sig").strip()
+    except (OSError, UnicodeDecodeError):
+        return None
+    if not header.startswith("#"):
+        return None
+    return header.lstrip("#").split()
+
+
+def _covmat_folders_fingerprint(installed_folders) -> Dict[str, tuple]:
+    # modification time and number of .covmat files of each folder, without listing
+    # them into memory or opening any file
+    fingerprint = {}
+    for folder in installed_folders:
+        with os.scandir(folder) as entries:
+            fingerprint[folder] = (
+                os.stat(folder).st_mtime_ns,
+                sum(1 for entry in entries if entry.name.endswith(Extension.covmat)))
+    return fingerprint
+
+
+def _sorted_covmat_database(covmat_database) -> Dict[CovmatFileKey, dict]:
+    # sort by number of params, then of data tags (stable: keeps the order of ties),
+    # so that simpler covmats come first when breaking ties in get_best_covmat_ext
+    return dict(sorted(covmat_database.items(),
+                       key=lambda x: (x[1]["nparams"], len(x[0].datatags))))
+
+
 def get_covmat_database(installed_folders, cached=True) -> Dict[CovmatFileKey, dict]:
     # Get folders with corresponding components installed
-    _hash = hashlib.md5(str(installed_folders).encode('utf8')).hexdigest()
+    # non-cryptographic cache key only
+    _hash = hashlib.blake2b(repr(installed_folders).encode('utf8'),
+                            digest_size=8).hexdigest()
     covmats_database_fullpath = os.path.join(get_cache_path(), _covmats_file % _hash)
     # Check if there is a usable cached one
     if cached:
         if covmats_database := _loaded_covmats_database.get(_hash):
             return covmats_database
         try:
-            with open(covmats_database_fullpath, "rb") as f:
-                covmat_database = pickle.load(f)
-            # quick and dirty hash for regeneration: check number of .covmat files
-            num_files = len(list(chain(
-                *[[filename for filename in os.listdir(folder)
-                   if filename.endswith(Extension.covmat)]
-                  for folder in installed_folders])))
-            assert num_files == len(covmat_database)
+            # map the file and unpickle from the buffer, skipping the buffered read
+            with open(covmats_database_fullpath, "rb") as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                folders_fingerprint, covmat_database = pickle.loads(mm)
+            # quick and dirty hash for regeneration: folders mtime and number of files
+            assert folders_fingerprint == _covmat_folders_fingerprint(installed_folders)
             log.debug("Loaded cached covmats database")
             _loaded_covmats_database[_hash] = covmat_database
             return covmat_database
@@ -72,31 +144,73 @@ def get_covmat_database(installed_folders, cached=True) -> Dict[CovmatFileKey, d
             log.info("No cached covmat database present, not usable or not up-to-date. "
                      "Will be re-created and cached.")
     # Create it (again)
-    covmat_database = {}
+    if cached:
+        folders_fingerprint = _covmat_folders_fingerprint(installed_folders)
+    covmat_files = []
     for folder_full in installed_folders:
-        for filename in os.listdir(folder_full):
-            try:
-                with open(os.path.join(folder_full, filename),
-                          encoding="utf-8-sig") as covmat:
-                    header = covmat.readline()
-                assert header.strip().startswith("#")
-                params = header.strip().lstrip("#").split()
-            except:
+        with os.scandir(folder_full) as entries:
+            covmat_files += [(folder_full, entry.name, entry.path) for entry in entries
+                             if entry.name.endswith(Extension.covmat)]
+    # Header reading is IO-bound, so overlap the reads in threads (order is kept)
+    with ThreadPoolExecutor(max_workers=_max_header_read_threads) as executor:
+        all_params = executor.map(_read_covmat_header_params,
+                                  [path for _, _, path in covmat_files])
+        covmat_database = {}
+        for (folder_full, filename, _), params in zip(covmat_files, all_params):
+            if params is None:
                 continue
             name = os.path.splitext(filename)[0]
             tags = name.replace('.post.', '_').replace('_post', '').split('_')
             partags = set(tags).intersection(params)
             datatags = set(tags[1:]) - partags
             key = covmat_file_key(partags, datatags, tags[0])
+            # params_set and nparams are cached for scoring by get_best_covmat_ext
             covmat_database[key] = {"folder": folder_full,
-                                    "name": filename, "params": params}
+                                    "name": filename, "params": params,
+                                    "params_set": frozenset(params),
+                                    "nparams": len(params)}
+    covmat_database = _sorted_covmat_database(covmat_database)
     if cached:
         with open(covmats_database_fullpath, "wb") as f:
-            pickle.dump(covmat_database, f)
+            pickle.dump((folders_fingerprint, covmat_database), f,
+                        pickle.HIGHEST_PROTOCOL)
         _loaded_covmats_database[_hash] = covmat_database
     return covmat_database
 
 
+def _covmat_info(covmat) -> dict:
+    # public part of a database entry (drops the fields cached for scoring)
+    return {"folder": covmat["folder"], "name": covmat["name"],
+            "params": covmat["params"]}
+
+
+_delimiter = re.compile(r"([_\.])")
+
+
+@lru_cache(maxsize=4096)
+def _delimited_spans(name) -> FrozenSet[str]:
+    """
+    Returns all substrings of ``name`` made of contiguous tokens (with their original
+    delimiters ``_`` and ``.``) that are preceded and followed by a delimiter,
+    i.e. all the likelihood names/aliases that match ``[_.]alias[_.]`` in ``name``.
+    """
+    parts = _delimiter.split(name)  # tokens at even indices, delimiters at odd ones
+    n_tokens = (len(parts) + 1) // 2
+    return frozenset("".join(parts[2 * i:2 * j + 1])
+                     for i in range(1, n_tokens - 1) for j in range(i, n_tokens - 1))
+
+
+@lru_cache(maxsize=32)
+def _load_covmat(path, _mtime_ns) -> np.ndarray:
+    # pandas' C parser is much faster than np.loadtxt; the modification time is only
+    # part of the cache key, so that changed files are reloaded.
+    # Returned as read-only, since it is shared between calls.
+    covmat = np.atleast_2d(pd.read_csv(path, sep=r"\s+", header=None, comment="#",
+                                       dtype=np.float64).to_numpy())
+    covmat.setflags(write=False)
+    return covmat
+
+
 def get_best_covmat(info, packages_path=None, cached=True):
     """
     Chooses optimal covmat from a database, based on common parameters and likelihoods.
@@ -108,17 +222,16 @@ def get_best_covmat(info, packages_path=None, cached=True):
 
     if not (packages_path := packages_path or info.get(packages_path_input)):
         raise LoggedError(log, "Needs a path to the external packages' installation.")
-    updated_info = update_info(info, strict=False)
-    for p, pinfo in list(updated_info["params"].items()):
-        if not is_sampled_param(pinfo):
-            updated_info["params"].pop(p)
+    updated_info = _update_info_cached(info)
+    updated_info["params"] = {p: pinfo for p, pinfo in updated_info["params"].items()
+                              if is_sampled_param(pinfo)}
     info_sampled_params = updated_info["params"]
     if not (covmat_data := get_best_covmat_ext(get_covmat_package_folders(packages_path),
                                                updated_info["params"],
                                                updated_info["likelihood"], cached)):
         return None
-    covmat = np.atleast_2d(
-        np.loadtxt(os.path.join(covmat_data["folder"], covmat_data["name"])))
+    covmat_path = os.path.join(covmat_data["folder"], covmat_data["name"])
+    covmat = _load_covmat(covmat_path, os.stat(covmat_path).st_mtime_ns)
     params_in_covmat = get_translated_params(info_sampled_params, covmat_data["params"])
     indices = [covmat_data["params"].index(p) for p in params_in_covmat.values()]
     covmat_data["covmat"] = covmat[indices][:, indices]
@@ -127,14 +240,23 @@ def get_best_covmat(info, packages_path=None, cached=True):
 
 
 def get_best_covmat_ext(covmat_dirs, params_info, likelihoods_info,
-                        cached=True, job_item=None, cov_map=empty_dict) -> Optional[dict]:
+                        cached=True, job_item=None, cov_map=empty_dict,
+                        extra_covmats=None, extra_params_info=None) -> Optional[dict]:
     """
     Actual covmat finder used by `get_best_covmat`. Call directly for more control on
     the parameters used.
 
+    ``extra_covmats`` can be a database (as returned by `get_covmat_database`) of
+    additional candidates, e.g. from grid chains, whose parameters are matched against
+    ``extra_params_info`` (default: ``params_info``) instead.
+
     Returns the same dict as `get_best_covmat`, except for the covariance matrix itself.
     """
-    if not (covmats_database := get_covmat_database(covmat_dirs, cached=cached)):
+    covmats_database = get_covmat_database(covmat_dirs, cached=cached) \
+        if covmat_dirs else {}
+    if extra_covmats:
+        covmats_database = _sorted_covmat_database({**covmats_database, **extra_covmats})
+    if not covmats_database:
         log.warning("No covariance matrices found at %s" % covmat_dirs)
         return None
 
@@ -144,18 +266,18 @@ def get_best_covmat_ext(covmat_dirs, params_info, likelihoods_info,
 
         # match all data tags and param tags independent of order
         if match := covmats_database.get(key_tuple):
-            return match
+            return _covmat_info(match)
         # match without base
         for tup, item in covmats_database.items():
             if tup[:2] == key_tuple[:2]:
-                return item
+                return _covmat_info(item)
         # match dropping "without" names
         keys = {key_tuple}
         for remove in (cov_map.get('without') or []):
             for param, data, base in keys.copy():
                 key = covmat_file_key(set(param) - {remove}, set(data) - {remove}, base)
                 if match := covmats_database.get(key):
-                    return match
+                    return _covmat_info(match)
                 keys.add(key)
         # match using rename dict
         if rename := cov_map.get("rename"):
@@ -166,7 +288,7 @@ def get_best_covmat_ext(covmat_dirs, params_info, likelihoods_info,
                                       chain(*[renames.get(p, [p]) for p in data]),
                                       rename.get(base, base))
                 if match := covmats_database.get(key):
-                    return match
+                    return _covmat_info(match)
                 keys.add(key)
         # include all renamed tag variants
         key_tuple = covmat_file_key(chain(*[x.paramtags for x in keys]),
@@ -176,17 +298,22 @@ def get_best_covmat_ext(covmat_dirs, params_info, likelihoods_info,
         key_tuple = None
 
     # Prepare params and likes aliases
-    params_renames = set(chain(*[[p] + str_to_list(info.get("renames", []))
-                                 for p, info in params_info.items()]))
-    likes_renames = set(chain(*[[like] + str_to_list((info or {}).get("aliases", []))
-                                for like, info in likelihoods_info.items()]))
-    delimiters = r"[_\.]"
-    likes_regexps = [re.compile(delimiters + re.escape(_like) + delimiters)
-                     for _like in likes_renames]
+    params_renames = frozenset(chain(*[[p] + str_to_list(info.get("renames", []))
+                                       for p, info in params_info.items()]))
+    likes_renames = frozenset(chain(
+        *[[like] + str_to_list((info or {}).get("aliases", []))
+          for like, info in likelihoods_info.items()]))
+    if extra_covmats:
+        extra_params_renames = params_renames if extra_params_info is None else \
+            frozenset(chain(*[[p] + str_to_list(info.get("renames", []))
+                              for p, info in extra_params_info.items()]))
 
     # Match number of params
+    # (intersection of two sets only iterates over the smaller one)
     def score_params(_key, covmat):
-        return len(set(covmat["params"]).intersection(params_renames))
+        if extra_covmats and _key in extra_covmats:
+            return len(covmat["params_set"] & extra_params_renames)
+        return len(covmat["params_set"] & params_renames)
 
     if not (best_p := get_best_score(covmats_database, score_params, 0)):
         log.warning(((job_item.name + ':\n') if job_item else '') +
@@ -194,40 +321,41 @@ def get_best_covmat_ext(covmat_dirs, params_info, likelihoods_info,
                     "one of the given parameters")
         return None
 
+    # Tags of the job item plus aliases, computed once for all covmats
+    if key_tuple:
+        likes_tags = likes_renames | key_tuple.datatags
+        params_tags = params_renames | key_tuple.paramtags
+
     # Match likelihood names / keywords
     # No debug print here: way too many!
     def score_likes(_key: CovmatFileKey, covmat):
         if key_tuple:
-            return len(_key.datatags.intersection(
-                likes_renames.union(key_tuple.datatags)))
-        return len([0 for r in likes_regexps if r.search(covmat["name"])])
-
-    best_p_l = get_best_score(best_p, score_likes)
-    if is_debug(log):
-        log.debug("Subset based on params + likes:\n - " +
-                  "\n - ".join([b["name"] for b in best_p_l.values()]))
+            return len(_key.datatags & likes_tags)
+        return len(_delimited_spans(covmat["name"]) & likes_renames)
 
-    if key_tuple:
-        def score_left_params(_key, _covmat):
-            return -len(_key.paramtags - params_renames.union(key_tuple.paramtags))
+    def score_left_params(_key, _covmat):
+        return -len(_key.paramtags - params_tags)
 
-        best_p_l = get_best_score(best_p_l, score_left_params)
+    # Likes (and left param tags) are strict tie-breaks of the previous stages,
+    # so score them together and pick the lexicographic maximum
+    tie_breaks = [score_likes] + ([score_left_params] if key_tuple else [])
+    subsets = get_best_scores(best_p, tie_breaks)
+    best_p_l, best_tied = subsets[0], subsets[-1]
 
     # Finally, in case there is more than one, select shortest #params and name (simpler!)
     # #params first, to avoid extended models with shorter covmat name
-    def score_simpler_params(_key, _covmat):
-        return -len(_covmat["params"])
-
-    best_p_l_sp = get_best_score(best_p_l, score_simpler_params)
+    # The database is sorted by #params and then #data tags, so the simplest covmats
+    # are the leading ones, and we can stop at the first one that is not a tie
+    first_key, first = next(iter(best_tied.items()))
+    best_p_l_sp = dict(takewhile(lambda x: x[1]["nparams"] == first["nparams"],
+                                 best_tied.items()))
+    best_p_l_sp_sn = dict(takewhile(
+        lambda x: len(x[0].datatags) == len(first_key.datatags), best_p_l_sp.items()))
     if is_debug(log):
+        log.debug("Subset based on params + likes:\n - " +
+                  "\n - ".join([b["name"] for b in best_p_l.values()]))
         log.debug("Subset based on params + likes + fewest params:\n - " +
                   "\n - ".join([b["name"] for b in best_p_l_sp.values()]))
-
-    def score_simpler_name(_key, _covmat):
-        return -len(_key.datatags)
-
-    best_p_l_sp_sn = get_best_score(best_p_l_sp, score_simpler_name)
-    if is_debug(log):
         log.debug("Subset based on params + likes + fewest params + shortest name:\n - " +
                   "\n - ".join([b["name"] for b in best_p_l_sp_sn.values()]))
     # if there is more than one (unlikely), just take first
@@ -235,12 +363,33 @@ def get_best_covmat_ext(covmat_dirs, params_info, likelihoods_info,
         log.warning(((job_item.name + ':\n') if job_item else '') +
                     "WARNING: using first of >1 possible best covmats: %r",
                     [b["name"] for b in best_p_l_sp_sn.values()])
-    return next(iter(best_p_l_sp_sn.values())).copy()
+    return _covmat_info(next(iter(best_p_l_sp_sn.values())))
 
 
 def get_best_score(covmats, score_func, min_score=None) -> dict:
-    scores = np.array([score_func(*x) for x in covmats.items()])
-    if min_score is not None and np.max(scores) <= min_score:
+    items = list(covmats.items())
+    # score the whole candidate set in one go, then select the max-score subset by index
+    scores = np.fromiter((score_func(*x) for x in items), dtype=int, count=len(items))
+    best = scores.max()
+    if min_score is not None and best <= min_score:
         return {}
-    i_max = np.argwhere(scores == np.max(scores)).T[0]
-    return dict(val for i, val in enumerate(covmats.items()) if i in i_max)
+    return dict(items[i] for i in np.flatnonzero(scores == best))
+
+
+def get_best_scores(covmats, score_funcs) -> List[dict]:
+    """
+    Scores all candidates with each of the ``score_funcs`` in a single pass, and
+    selects the lexicographic maximum, i.e. later scores only break ties of the
+    previous ones.
+
+    Returns the remaining subset of candidates after each of the scores.
+    """
+    items = list(covmats.items())
+    scores = np.array([[score_func(*x) for score_func in score_funcs] for x in items],
+                      dtype=int).reshape(len(items), len(score_funcs))
+    best = np.ones(len(items), dtype=bool)
+    subsets = []
+    for score in scores.T:
+        best &= score == np.max(score[best])
+        subsets.append(dict(items[i] for i in np.flatnonzero(best)))
+    return subsets
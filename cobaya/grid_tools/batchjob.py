@@ -225,6 +225,16 @@ class ImportanceFilter(ImportanceSetting):
                          minimize=minimize)
 
 
+class FilterByDatasetName:
+    # importance filter selecting job items whose data set includes all required names
+
+    def __init__(self, required):
+        self.required = frozenset([required] if isinstance(required, str) else required)
+
+    def want_importance(self, jobItem):
+        return jobItem.data_set.hasAll(self.required)
+
+
 class JobItem(PropertiesItem):
     importanceTag: str
     importanceSettings: list
@@ -23,7 +23,7 @@ from cobaya.install import install as install_reqs
 from cobaya.tools import sort_cosmetic, warn_deprecation, resolve_packages_path
 from cobaya.grid_tools import batchjob
 from cobaya.cosmo_input import create_input, get_best_covmat_ext, \
-    get_covmat_package_folders
+    get_covmat_package_folders, get_covmat_database
 from cobaya.parameterization import is_sampled_param
 
 
@@ -208,6 +208,22 @@ def makeGrid(batchPath, settingName=None, settings=None, read_only=False,
     print("Adding covmats (if necessary) and writing input files")
     cov_dir = dic.get("cov_dir")  # None means use the default from mcmc settings
     def_packages = cov_dir or install_reqs_at or resolve_packages_path()
+    # Optionally, warm-start new items with the covmats learned by finished items,
+    # or by items that have reached a given R-1 (read once here, and not cached,
+    # since they change as the grid runs)
+    if cov_from_grid := dic.get("cov_from_grid"):
+        def covmat_learned(item):
+            if isinstance(cov_from_grid, bool):
+                return item.chainFinished()
+            R = item.convergeStat()[0]
+            return R is not None and R <= cov_from_grid
+
+        grid_covmats = get_covmat_database(
+            [item.chainPath for item in batch.items(wantSubItems=False)
+             if os.path.exists(item.chainRoot + Extension.covmat)
+             and covmat_learned(item)], cached=False)
+    else:
+        grid_covmats = {}
     for job_item in batch.items(wantSubItems=False):
         info = infos[job_item.paramtag][job_item.data_set.tag]
         # Covariance matrices
@@ -216,15 +232,28 @@ def makeGrid(batchPath, settingName=None, settings=None, read_only=False,
             sampler = list(info["sampler"])[0]
         except KeyError:
             raise ValueError("No sampler has been chosen: %s" % job_item.name)
-        if sampler == "mcmc" and (cov_dir or cov_dir is None and
-                                  info["sampler"][sampler].get("covmat") == "auto"):
-            if not (cov_dirs := make_list(cov_dir or [])):
+        covmat = info["sampler"][sampler].get("covmat") if sampler == "mcmc" else None
+        # (covmat may also be given as a matrix)
+        auto_covmat = isinstance(covmat, str) and covmat.lower() == "auto"
+        use_package_covmats = cov_dir is None and auto_covmat
+        # only items not run yet, and not given a covmat explicitly
+        if grid_covmats and (covmat is None or auto_covmat) \
+                and not job_item.chainExists():
+            item_grid_covmats = {key: item for key, item in grid_covmats.items()
+                                 if item["folder"] != job_item.chainPath}
+        else:
+            item_grid_covmats = {}
+        if sampler == "mcmc" and (cov_dir or use_package_covmats or item_grid_covmats):
+            cov_dirs = make_list(cov_dir or [])
+            if not cov_dirs and use_package_covmats:
                 if not (packages_path := install_reqs_at or info.get(packages_path_input)
                                          or def_packages):
-                    raise ValueError(
-                        "Cannot assign automatic covariance matrices because no "
-                        "external packages path has been defined.")
-                cov_dirs = get_covmat_package_folders(os.path.abspath(packages_path))
+                    if not item_grid_covmats:
+                        raise ValueError(
+                            "Cannot assign automatic covariance matrices because no "
+                            "external packages path has been defined.")
+                else:
+                    cov_dirs = get_covmat_package_folders(os.path.abspath(packages_path))
             # Need updated info for covmats: includes renames
             updated_info = update_info(info)
             # Ideally, we use slow+sampled parameters to look for the covariance matrix
@@ -233,15 +262,22 @@ def makeGrid(batchPath, settingName=None, settings=None, read_only=False,
             like_params = set(chain(*[
                 list(like.get("params") or [])
                 for like in updated_info["likelihood"].values()]))
-            params_info = {p: v for p, v in updated_info["params"].items()
-                           if is_sampled_param(v) and p not in like_params}
+            sampled_params_info = {p: v for p, v in updated_info["params"].items()
+                                   if is_sampled_param(v)}
+            params_info = {p: v for p, v in sampled_params_info.items()
+                           if p not in like_params}
 
+            # the covmats of grid items include all sampled params
             best_covmat = get_best_covmat_ext(cov_dirs, params_info,
                                               updated_info["likelihood"],
                                               job_item=job_item,
-                                              cov_map=dic.get("cov_map") or {})
-            info["sampler"][sampler]["covmat"] = os.path.join(
-                best_covmat["folder"], best_covmat["name"]) if best_covmat else None
+                                              cov_map=dic.get("cov_map") or {},
+                                              extra_covmats=item_grid_covmats,
+                                              extra_params_info=sampled_params_info)
+            # missing parameters are filled in by the sampler from the ref/prior
+            if best_covmat or cov_dir or use_package_covmats:
+                info["sampler"][sampler]["covmat"] = os.path.join(
+                    best_covmat["folder"], best_covmat["name"]) if best_covmat else None
             if show_covmats:
                 print(job_item.name, '->', (best_covmat or {}).get("name"))
 
@@ -14,6 +14,15 @@ from cobaya.grid_tools.gridmanage import run_and_wait
 from cobaya.tools import warn_deprecation
 
 
+def _available_cpus() -> int:
+    # CPUs this process can use (i.e. respecting the affinity set by e.g. a cluster
+    # allocation), where the platform supports it
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
 def grid_run(args=None):
     warn_deprecation()
     Opts = batchjob_args.BatchArgs(
@@ -24,7 +33,8 @@ def grid_run(args=None):
     Opts.parser.add_argument('--noqueue', nargs='?', default=None, type=int, const=1,
                              help='run directly, not using queue, ignoring most other '
                                   'arguments (e.g. for fast tests). Optional argument '
-                                  'specifies how many to run in parallel.'
+                                  'specifies how many to run in parallel '
+                                  '(0 for the number of CPUs). '
                                   'To use mpi, include mpirun in the --program argument.')
     Opts.parser.add_argument('--subitems', action='store_true',
                              help='include sub-grid items')
@@ -52,6 +62,14 @@ def grid_run(args=None):
                              help='only run if parent chain is not still running')
     (batch, args) = Opts.parseForBatch(args)
 
+    if args.noqueue is not None:
+        if args.noqueue < 0:
+            Opts.parser.error('--noqueue must be 0 (number of CPUs) or a positive '
+                              'number of items to run in parallel')
+        if not args.noqueue:
+            # grid items are independent runs, so use all the available CPUs
+            args.noqueue = _available_cpus()
+
     if args.not_queued:
         assert not args.noqueue, 'Cannot use --noqueue and --not_queued'
         print('Getting queued names...')
@@ -7,11 +7,22 @@
 """
 import os
 import copy
+import subprocess
+from functools import lru_cache
+from itertools import chain
 from cobaya.tools import working_directory
 from cobaya.grid_tools.batchjob_args import BatchArgs
 from getdist import types, paramnames
 from getdist.mcsamples import loadMCSamples
 
+_tex_escape_table = str.maketrans({'_': '{\\textunderscore}'})
+
+
+@lru_cache(maxsize=1024)
+def tex_escape_text(string):
+    # cached, since the same job item names are escaped several times
+    return string.translate(_tex_escape_table)
+
 
 def grid_tables(args=None):
 
@@ -88,8 +99,19 @@ def grid_tables(args=None):
     if args.paramList is not None:
         args.paramList = paramnames.ParamNames(args.paramList)
 
-    def tex_escape_text(string):
-        return string.replace('_', '{\\textunderscore}')
+    # Loaded results do not depend on the limit, so only load them once for each
+    # chain and set of options (e.g. when making tables for all limits)
+    loaded_results = {}
+
+    def load_job_item_results(job_item, **kwargs):
+        key = (job_item.chainRoot, tuple(sorted(kwargs.items())))
+        if (results := loaded_results.get(key)) is None:
+            job_item.loadJobItemResults(paramNameFile=args.paramNameFile, **kwargs)
+            loaded_results[key] = (job_item.result_converge, job_item.result_marge,
+                                   job_item.result_likemarge, job_item.result_bestfit)
+        else:
+            (job_item.result_converge, job_item.result_marge,
+             job_item.result_likemarge, job_item.result_bestfit) = results
 
     def get_table_lines(content, _referenceDataJobItem=None):
         if _referenceDataJobItem is not None:
@@ -126,9 +148,8 @@ def grid_tables(args=None):
 
         table_lines = []
         caption = []
-        jobItem.loadJobItemResults(paramNameFile=args.paramNameFile,
-                                   bestfit=not args.nobestfit,
-                                   bestfitonly=args.bestfitonly)
+        load_job_item_results(jobItem, bestfit=not args.nobestfit,
+                              bestfitonly=args.bestfitonly)
         bf = jobItem.result_bestfit
         if bf is not None:
             caption.append(
@@ -175,23 +196,25 @@ def grid_tables(args=None):
                 compChiSq = deltaChisqJobItem.result_bestfit
             else:
                 compChiSq = None
-            for kind, vals in bf.sortedChiSquareds():
-                table_lines.append(kind + ' - ')
-                for val in vals:
-                    line = '  ' + tex_escape_text(val.name) + ': ' + (
-                            '%.2f' % val.chisq) + ' '
-                    if compChiSq is not None:
-                        comp = compChiSq.chiSquareForKindName(kind, val.name)
-                        if comp is not None:
-                            line += r'($\Delta$ ' + ('%.2f' % (val.chisq - comp)) + ') '
-                    table_lines.append(line)
+
+            def chisq_line(kind, val):
+                line = '  ' + tex_escape_text(val.name) + ': ' + (
+                        '%.2f' % val.chisq) + ' '
+                if compChiSq is not None:
+                    comp = compChiSq.chiSquareForKindName(kind, val.name)
+                    if comp is not None:
+                        line += r'($\Delta$ ' + ('%.2f' % (val.chisq - comp)) + ') '
+                return line
+
+            table_lines.extend(line for kind, vals in bf.sortedChiSquareds()
+                               for line in chain([kind + ' - '],
+                                                 (chisq_line(kind, val) for val in vals)))
         return table_lines
 
     def compare_table(jobItems, titles=None):
         for job_i in jobItems:
-            job_i.loadJobItemResults(paramNameFile=args.paramNameFile,
-                                     bestfit=not args.nobestfit,
-                                     bestfitonly=args.bestfitonly)
+            load_job_item_results(job_i, bestfit=not args.nobestfit,
+                                  bestfitonly=args.bestfitonly)
             print(job_i.name)
         if titles is None:
             titles = [job_i.datatag for job_i in jobItems if
@@ -237,22 +260,48 @@ def grid_tables(args=None):
         else:
             return job_i.normed_data
 
+    # Reference items are shallow copies: loading results rebinds all the result_*
+    # attributes, so the copies' results are independent of the original items'
+    # Batches are grouped by paramtag, so whether they are references for the
+    # Delta chi^2 only needs checking once per batch
+    if args.delta_chisq_paramtag is not None:
+        def is_reference_batch(_paramtag, _parambatch):
+            return _paramtag == args.delta_chisq_paramtag
+    elif not args.no_delta_chisq:
+        def is_reference_batch(_paramtag, _parambatch):
+            return len(_parambatch[0].param_set) == 0
+    else:
+        def is_reference_batch(_paramtag, _parambatch):
+            return False
+
     baseJobItems = {}
     for paramtag, parambatch in items:
-        isBase = len(parambatch[0].param_set) == 0
+        if not is_reference_batch(paramtag, parambatch):
+            continue
         for job_item in parambatch:
-            if (args.delta_chisq_paramtag is None and
-                    isBase and not args.no_delta_chisq or
-                    args.delta_chisq_paramtag is not None
-                    and job_item.paramtag == args.delta_chisq_paramtag):
-                referenceJobItem = copy.deepcopy(job_item)
-                referenceJobItem.loadJobItemResults(paramNameFile=args.paramNameFile)
-                baseJobItems[job_item.normed_data] = referenceJobItem
+            referenceJobItem = copy.copy(job_item)
+            load_job_item_results(referenceJobItem)
+            baseJobItems[job_item.normed_data] = referenceJobItem
 
     loc = os.path.split(args.latex_filename)[0]
     if loc:
         os.makedirs(loc, exist_ok=True)
 
+    # document preamble is the same for all limits
+    preamble = ''
+    if not args.forpaper:
+        preamble_lines = ['\\documentclass[10pt]{article}',
+                          '\\usepackage[pdftex]{hyperref}',
+                          '\\usepackage[paperheight=' + args.height +
+                          ',paperwidth=' + args.width + ',margin=0.8in]{geometry}',
+                          '\\renewcommand{\\arraystretch}{1.5}',
+                          '\\begin{document}']
+        if args.header_tex is not None:
+            with open(args.header_tex, 'r') as f:
+                preamble_lines.append(f.read())
+        preamble_lines.append('\\tableofcontents')
+        preamble = '\n'.join(preamble_lines) + '\n'
+
     for limit in limits:
         args.limit = limit
 
@@ -262,144 +311,153 @@ def grid_tables(args=None):
         if outfile[-4:] != '.tex':
             outfile += '.tex'
 
-        lines = []
-        if not args.forpaper:
-            lines.append('\\documentclass[10pt]{article}')
-            lines.append('\\usepackage[pdftex]{hyperref}')
-            lines.append('\\usepackage[paperheight=' + args.height +
-                         ',paperwidth=' + args.width + ',margin=0.8in]{geometry}')
-            lines.append('\\renewcommand{\\arraystretch}{1.5}')
-            lines.append('\\begin{document}')
-            if args.header_tex is not None:
-                lines.append(open(args.header_tex, 'r').read())
-            lines.append('\\tableofcontents')
-
-        # set of baseline results, e.g. for Delta chi^2
-
-        for paramtag, parambatch in items:
-            isBase = len(parambatch[0].param_set) == 0
-            if not args.forpaper:
-                if isBase:
-                    paramText = 'Baseline model'
+        (outdir, outname) = os.path.split(outfile)
+        if outdir:
+            os.makedirs(outdir, exist_ok=True)
+        # stream the document to the file, rather than accumulating all lines
+        with open(outfile, 'w', encoding='utf-8', buffering=1 << 20) as out:
+            out.write(preamble)
+
+            # set of baseline results, e.g. for Delta chi^2
+
+            for paramtag, parambatch in items:
+                isBase = len(parambatch[0].param_set) == 0
+                if not args.forpaper:
+                    if isBase:
+                        paramText = 'Baseline model'
+                    else:
+                        paramText = tex_escape_text("+".join(parambatch[0].param_set))
+                    section = '\\newpage\\section{ ' + paramText + '}'
                 else:
-                    paramText = tex_escape_text("+".join(parambatch[0].param_set))
-                section = '\\newpage\\section{ ' + paramText + '}'
-            else:
-                section = ''
-            if args.compare is not None:
-                compares = opts.filterForDataCompare(parambatch, args.compare)
-                if len(compares) == len(args.compare):
-                    lines.append(section)
-                    lines += compare_table(compares, args.titles)
+                    section = ''
+                if args.compare is not None:
+                    compares = opts.filterForDataCompare(parambatch, args.compare)
+                    if len(compares) == len(args.compare):
+                        out.write(section + '\n')
+                        out.writelines(line + '\n' for line in
+                                       compare_table(compares, args.titles))
+                    else:
+                        print('no matches for compare: ' + paramtag)
                 else:
-                    print('no matches for compare: ' + paramtag)
-            else:
-                lines.append(section)
-                theseItems = [jobItem for jobItem in parambatch
-                              if (os.path.exists(jobItem.distPath) or args.bestfitonly)
-                              and (args.converge == 0
-                                   or jobItem.hasConvergeBetterThan(args.converge))]
-
-                referenceDataJobItem = None
-                if args.changes_from_datatag is not None:
-                    for job_item in theseItems:
-                        if (job_item.normed_data == args.changes_from_datatag
-                                or job_item.datatag == args.changes_from_datatag):
-                            referenceDataJobItem = copy.deepcopy(job_item)
-                            referenceDataJobItem.loadJobItemResults(
-                                paramNameFile=args.paramNameFile,
-                                bestfit=args.bestfitonly)
-                if args.changes_adding_data is not None:
-                    baseJobItems = {}
-                    refItems = []
-                    for job_item in theseItems:
-                        if job_item.data_set.hasName(args.changes_adding_data):
-                            job_item.normed_without = "_".join(
-                                sorted([x for x in job_item.data_set.names if
-                                        x not in args.changes_adding_data]))
-                            refItems.append(job_item.normed_without)
-                        else:
-                            job_item.normed_without = None
-                    for job_item in theseItems:
-                        if job_item.normed_data in refItems:
-                            referenceJobItem = copy.deepcopy(job_item)
-                            referenceJobItem.loadJobItemResults(
-                                paramNameFile=args.paramNameFile,
-                                bestfit=args.bestfitonly)
-                            baseJobItems[job_item.normed_data] = referenceJobItem
-                if args.changes_replacing is not None:
-                    origCompare = [item for item in theseItems if
-                                   args.changes_replacing[0] in item.data_set.names]
-                    baseJobItems = {}
-                    for job_item in origCompare:
-                        referenceJobItem = copy.deepcopy(job_item)
-                        referenceJobItem.loadJobItemResults(
-                            paramNameFile=args.paramNameFile,
-                            bestfit=args.bestfitonly)
-                        baseJobItems[job_item.normed_data] = referenceJobItem
-
-                for job_item in theseItems:
+                    out.write(section + '\n')
+                    theseItems = [jobItem for jobItem in parambatch
+                                  if (os.path.exists(jobItem.distPath)
+                                      or args.bestfitonly)
+                                  and (args.converge == 0
+                                       or jobItem.hasConvergeBetterThan(args.converge))]
+
+                    referenceDataJobItem = None
+                    if args.changes_from_datatag is not None:
+                        for job_item in theseItems:
+                            if (job_item.normed_data == args.changes_from_datatag
+                                    or job_item.datatag == args.changes_from_datatag):
+                                referenceDataJobItem = copy.copy(job_item)
+                                load_job_item_results(referenceDataJobItem,
+                                                      bestfit=args.bestfitonly)
                     if args.changes_adding_data is not None:
-                        if job_item.normed_without is not None:
-                            referenceDataJobItem = baseJobItems.get(
-                                job_item.normed_without, None)
-                        else:
-                            referenceDataJobItem = None
-                        referenceJobItem = referenceDataJobItem
-                        if args.changes_only and not referenceDataJobItem:
-                            continue
-                    elif args.changes_replacing is not None:
-                        referenceDataJobItem = None
-                        for replace in args.changes_replacing[1:]:
-                            if replace in job_item.data_set.names:
+                        baseJobItems = {}
+                        refItems = []
+                        for job_item in theseItems:
+                            if job_item.data_set.hasName(args.changes_adding_data):
+                                job_item.normed_without = "_".join(
+                                    sorted([x for x in job_item.data_set.names if
+                                            x not in args.changes_adding_data]))
+                                refItems.append(job_item.normed_without)
+                            else:
+                                job_item.normed_without = None
+                        for job_item in theseItems:
+                            if job_item.normed_data in refItems:
+                                referenceJobItem = copy.copy(job_item)
+                                load_job_item_results(referenceJobItem,
+                                                      bestfit=args.bestfitonly)
+                                baseJobItems[job_item.normed_data] = referenceJobItem
+                    if args.changes_replacing is not None:
+                        origCompare = [item for item in theseItems if
+                                       args.changes_replacing[0] in item.data_set.names]
+                        baseJobItems = {}
+                        for job_item in origCompare:
+                            referenceJobItem = copy.copy(job_item)
+                            load_job_item_results(referenceJobItem,
+                                                  bestfit=args.bestfitonly)
+                            baseJobItems[job_item.normed_data] = referenceJobItem
+
+                    for job_item in theseItems:
+                        if args.changes_adding_data is not None:
+                            if job_item.normed_without is not None:
                                 referenceDataJobItem = baseJobItems.get(
-                                    batch.normalizeDataTag(
-                                        job_item.data_set.tagReplacing(
-                                            replace, args.changes_replacing[0])), None)
-                                break
-                        referenceJobItem = referenceDataJobItem
-                        if args.changes_only and not referenceDataJobItem:
-                            continue
-                    else:
-                        referenceJobItem = baseJobItems.get(data_index(job_item), None)
-                    if args.changes_from_paramtag is not None:
-                        referenceDataJobItem = referenceJobItem
-                    if args.systematic_average and referenceDataJobItem is None:
-                        continue
-                    if not args.forpaper:
-                        if args.systematic_average:
-                            lines.append('\\subsection{ ' + tex_escape_text(
-                                job_item.name) + '/' + tex_escape_text(
-                                referenceDataJobItem.name) + '}')
+                                    job_item.normed_without, None)
+                            else:
+                                referenceDataJobItem = None
+                            referenceJobItem = referenceDataJobItem
+                            if args.changes_only and not referenceDataJobItem:
+                                continue
+                        elif args.changes_replacing is not None:
+                            referenceDataJobItem = None
+                            for replace in args.changes_replacing[1:]:
+                                if replace in job_item.data_set.names:
+                                    referenceDataJobItem = baseJobItems.get(
+                                        batch.normalizeDataTag(
+                                            job_item.data_set.tagReplacing(
+                                                replace, args.changes_replacing[0])),
+                                        None)
+                                    break
+                            referenceJobItem = referenceDataJobItem
+                            if args.changes_only and not referenceDataJobItem:
+                                continue
                         else:
-                            lines.append(
-                                '\\subsection{ ' + tex_escape_text(job_item.name) + '}')
-                    try:
-                        tableLines = param_result_table(job_item, referenceJobItem,
-                                                        referenceDataJobItem)
-                        if args.separate_tex:
-                            types.TextFile(tableLines).write(job_item.distRoot + '.tex')
-                        lines += tableLines
-                    except Exception as e:
-                        print('ERROR: ' + job_item.name)
-                        print("Index Error:" + str(e))
+                            referenceJobItem = baseJobItems.get(data_index(job_item),
+                                                                None)
+                        if args.changes_from_paramtag is not None:
+                            referenceDataJobItem = referenceJobItem
+                        if args.systematic_average and referenceDataJobItem is None:
+                            continue
+                        if not args.forpaper:
+                            if args.systematic_average:
+                                out.write('\\subsection{ ' + tex_escape_text(
+                                    job_item.name) + '/' + tex_escape_text(
+                                    referenceDataJobItem.name) + '}\n')
+                            else:
+                                out.write('\\subsection{ ' +
+                                          tex_escape_text(job_item.name) + '}\n')
+                        try:
+                            tableLines = param_result_table(job_item, referenceJobItem,
+                                                            referenceDataJobItem)
+                            if args.separate_tex:
+                                types.TextFile(tableLines).write(
+                                    job_item.distRoot + '.tex')
+                            out.writelines(line + '\n' for line in tableLines)
+                        except Exception as e:
+                            print('ERROR: ' + job_item.name)
+                            print("Index Error:" + str(e))
 
-        if not args.forpaper:
-            lines.append('\\end{document}')
+            if not args.forpaper:
+                out.write('\\end{document}\n')
 
-        (outdir, outname) = os.path.split(outfile)
-        if outdir:
-            os.makedirs(outdir, exist_ok=True)
-        types.TextFile(lines).write(outfile)
         root = os.path.splitext(outname)[0]
 
         if not args.forpaper:
             print('Now converting to PDF...')
             delext = ['aux', 'log', 'out', 'toc']
             with working_directory(outdir):
+                aux = None
                 for _ in range(3):
-                    # iterate three times to get table of contents page numbers right
-                    os.system('pdflatex ' + outname)
+                    # iterate up to three times to get table of contents page numbers
+                    # right (done when the .aux file does not change any more)
+                    try:
+                        res = subprocess.run(['pdflatex', '-interaction=batchmode',
+                                              '-halt-on-error', outname], check=False)
+                    except FileNotFoundError:
+                        print('pdflatex not found: only the .tex file was produced')
+                        break
+                    if res.returncode:
+                        print('ERROR: pdflatex failed, see ' + root + '.log')
+                        delext.remove('log')
+                        break
+                    with open(root + '.aux', 'rb') as f:
+                        new_aux = f.read()
+                    if new_aux == aux:
+                        break
+                    aux = new_aux
                 for ext in delext:
                     if os.path.exists(root + '.' + ext):
                         os.remove(root + '.' + ext)
@@ -9,7 +9,6 @@
 from typing import Any
 import numpy as np
 from scipy.stats import multivariate_normal, uniform, random_correlation
-from scipy.special import logsumexp
 
 # Local
 from cobaya.likelihood import Likelihood
@@ -113,6 +112,12 @@ class GaussianMixture(Likelihood):
 
         # Prepare the transformation(s) for the derived parameters
         self.inv_choleskyL = [inverse_cholesky(cov) for cov in self.covs]
+        # Stacked whitening transformations and log-normalizations of the components,
+        # to evaluate all of them with a couple of vectorized operations per call
+        self._inv_choleskyL = np.ascontiguousarray(self.inv_choleskyL, dtype=np.float64)
+        log_det_covs = -2 * np.sum(
+            np.log(np.diagonal(self._inv_choleskyL, axis1=1, axis2=2)), axis=1)
+        self._log_norms = -0.5 * (self.d() * np.log(2 * np.pi) + log_det_covs)
 
     def logp(self, **params_values):
         """
@@ -121,21 +126,25 @@ class GaussianMixture(Likelihood):
         self.wait()
         # Prepare the vector of sampled parameter values
         x = np.array([params_values[p] for p in self.input_params])
+        # Standardized vectors for all components, L^{-1} (x - mean)
+        standard = np.einsum("kij,kj->ki", self._inv_choleskyL, x - self.means)
         # Fill the derived parameters
         derived = params_values.get("_derived")
         if derived is not None:
             n = self.d()
             for i in range(self.n_modes):
-                standard = self.inv_choleskyL[i].dot(x - self.means[i])
                 derived.update(
                     (p, v) for p, v in
-                    zip(list(self.output_params)[i * n:(i + 1) * n], standard))
+                    zip(list(self.output_params)[i * n:(i + 1) * n], standard[i]))
         # Compute the likelihood and return
+        logpdfs = self._log_norms - 0.5 * np.einsum("ki,ki->k", standard, standard)
         if len(self.gaussians) == 1:
-            return self.gaussians[0].logpdf(x)
+            return logpdfs[0]
         else:
-            return logsumexp([gauss.logpdf(x) for gauss in self.gaussians],
-                             b=self.weights)
+            # weighted logsumexp (logpdfs are always finite)
+            max_logpdf = np.max(logpdfs)
+            return max_logpdf + np.log(
+                np.sum(self.weights * np.exp(logpdfs - max_logpdf)))
 
 
 # Scripts to generate random means and covariances #######################################
@@ -524,13 +524,15 @@ def post(info_or_yaml_or_file: Union[InputDict, str, os.PathLike],
     weights = []
     done = 0
     last_dump_time = time.time()
+    sampled_params = dummy_model_in.parameterization.sampled_params()
     for collection_in, collection_out in zip(in_collections, out_collections):
         importance_weights = []
+        # -logpost of the input points that have been added to the output collection
+        minuslogpost_in_added = []
 
         def set_difflogmax():
             nonlocal difflogmax
-            difflog = (collection_in[OutPar.minuslogpost].to_numpy(
-                dtype=np.float64)[:len(collection_out)]
+            difflog = (np.array(minuslogpost_in_added, dtype=np.float64)
                        - collection_out[OutPar.minuslogpost].to_numpy(dtype=np.float64))
             difflogmax = np.max(difflog)
             if abs(difflogmax) < 1:
@@ -544,9 +546,16 @@ def post(info_or_yaml_or_file: Union[InputDict, str, os.PathLike],
             importance_weights.extend(_weights)
             collection_out.reweight(_weights)
 
-        sampled_params = dummy_model_in.parameterization.sampled_params()
-
-        for i, point in collection_in.data.iterrows():
+        if prior_recompute_1d:
+            # Points outside the new 1d prior bounds have zero weight (e.g. a tightened
+            # prior): mask them out all at once, instead of point by point
+            bounds = model_add.prior.bounds()
+            values = collection_in[list(sampled_params)].to_numpy(dtype=np.float64)
+            points_in = collection_in.data[np.all(
+                (values >= bounds[:, 0]) & (values <= bounds[:, 1]), axis=1)]
+        else:
+            points_in = collection_in.data
+        for i, point in points_in.iterrows():
             all_params = point.to_dict()
             for p in remove_params:
                 all_params.pop(p, None)
@@ -635,6 +644,7 @@ def post(info_or_yaml_or_file: Union[InputDict, str, os.PathLike],
             if weight > 0:
                 collection_out.add(sampled, derived=derived.values(), weight=weight,
                                    logpriors=logpriors_new, loglikes=loglikes_new)
+                minuslogpost_in_added.append(point.get(OutPar.minuslogpost))
 
             # Display progress
             percent = int(np.round((i + done) / to_do * 100))
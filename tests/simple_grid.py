@@ -1,9 +1,10 @@
 # sample grid parameter file
 # build grid with "cobaya-grid-create grid_dir simple_grid.py"
+# run all items in parallel, one per CPU, with "cobaya-grid-run grid_dir --noqueue 0"
 
 import numpy as np
 from cobaya import InputDict
-from cobaya.grid_tools.batchjob import DataSet
+from cobaya.grid_tools.batchjob import DataSet, FilterByDatasetName
 
 # grid items not to include
 skip = ['base_a_1_like1_like2']
@@ -22,6 +23,12 @@ importance_defaults = []
 minimize_defaults = []
 getdist_options = {'ignore_rows': 0.3, 'marker[b_0]': 0}
 
+# gaussian_mixture means and covmats (float64, contiguous)
+MEANS_1 = np.array([-1., 0., 1.], dtype=np.float64)
+COV_1 = np.ascontiguousarray(np.eye(3, dtype=np.float64))
+MEANS_2 = np.array([0.], dtype=np.float64)
+COV_2 = np.array([[0.1]], dtype=np.float64)
+
 like1: InputDict = {
     'likelihood':
         {'mix1': {
@@ -29,18 +36,16 @@ like1: InputDict = {
             # two gaussian_mixture likelihoods at the same time the names are distinct
             # This is not otherwise needed
             'class': 'gaussian_mixture',
-            'means': [np.array([-1, 0, 1])],
-            'covs': [np.array([[1, 0, 0],
-                               [0, 1, 0],
-                               [0, 0, 1]])],
+            'means': [MEANS_1],
+            'covs': [COV_1],
             'input_params_prefix': 'a'}}}
 
 like2: InputDict = {
     'likelihood':
         {'mix2': {
             'class': 'gaussian_mixture',
-            'means': [np.array([0])],
-            'covs': [0.1],
+            'means': [MEANS_2],
+            'covs': [COV_2],
             'input_params_prefix': 'b'}},
     'params': {'b_0': {'prior': {'min': -1, 'max': 1}}}
 }
@@ -49,9 +54,9 @@ like2: InputDict = {
 joint = DataSet(['like1', 'like2'], [like1, like2])
 
 
-class ImportanceFilterb0:
-    def want_importance(self, jobItem):
-        return "like2" in jobItem.data_set.names
+class ImportanceFilterb0(FilterByDatasetName):
+    def __init__(self):
+        super().__init__(required={"like2"})
 
 
 # Dictionary of groups of data/parameter combination to run
@@ -77,11 +82,16 @@ params = {'a_1': {'prior': {'min': -2, 'max': 2}},
 # Additional (non-params) options to use when each parameter is varied.
 # If you need specific options (not just the union) for combinations,
 # can also use param tag (e.g. a_1_a_2) entries
-param_extra_opts = {'a_2': {'sampler': {'mcmc': {'max_samples': 100}}}}
+param_extra_opts = {'a_1': {'sampler': {'mcmc': {'covmat': np.eye(2) * 0.1,
+                                                  'covmat_params': ['a_0', 'a_1']}}},
+                    'a_2': {'sampler': {'mcmc': {'max_samples': 100}}}}
 
 # optional directory (or list) to look for pre-computed covmats with similar parameters
 # here we don't want covmats so set to empty string
 cov_dir = ""
+# when re-creating the grid, start new items from the covmats of finished items
+# (True) or of items that have reached the given R-1
+cov_from_grid = 0.2
 # optional mapping of name tags onto pre-computed covmat file names
 cov_map = {"without": ['lensing', 'BAO'],
            "remame": {'NPIPE': 'plikHM', 'lowl': ('lowl', 'lowE')}
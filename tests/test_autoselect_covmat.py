@@ -0,0 +1,108 @@
+import os
+import numpy as np
+
+from cobaya.cosmo_input import autoselect_covmat
+from cobaya.cosmo_input.autoselect_covmat import get_best_covmat_ext
+
+cosmo_params = ["omegabh2", "omegach2", "theta", "tau"]
+
+# name: parameters in header
+covmats = {
+    "base_plikHM_TT": cosmo_params[:3],
+    "base_plikHM_TT_lowl": cosmo_params,
+    "base_BAO": cosmo_params,
+    # same as base_plikHM_TT_lowl, but more data tags
+    "base_plikHM_TT_lowl_lensing": cosmo_params,
+    # same as base_plikHM_TT_lowl, but more params
+    "base_mnu_plikHM_TT_lowl": cosmo_params + ["mnu"],
+    # fewer data tags than base_plikHM_TT_lowl, but more params
+    "base_plikHM_lowl": cosmo_params + ["nuisance"]}
+
+
+def write_covmats(folder, covmats_params):
+    for name, params in covmats_params.items():
+        np.savetxt(os.path.join(folder, name + ".covmat"), np.eye(len(params)),
+                   header=" ".join(params))
+
+
+def best_name(folders, params, likes, **kwargs):
+    best = get_best_covmat_ext(folders, {p: {} for p in params}, likes, **kwargs)
+    return best and best["name"]
+
+
+def test_autoselect_covmat(tmpdir):
+    folder = str(tmpdir)
+    write_covmats(folder, covmats)
+    # largest number of params in common
+    assert best_name([folder], ["omegabh2", "mnu"], {}, cached=False) == \
+           "base_mnu_plikHM_TT_lowl.covmat"
+    assert best_name([folder], ["other"], {}, cached=False) is None
+    # then, most likelihoods in common (also using aliases)
+    assert best_name([folder], cosmo_params, {"BAO": None}, cached=False) == \
+           "base_BAO.covmat"
+    assert best_name([folder], cosmo_params, {"bao": {"aliases": ["BAO"]}},
+                     cached=False) == "base_BAO.covmat"
+    # then, fewest params, and then fewest data tags
+    assert best_name([folder], cosmo_params, {"plikHM": None, "lowl": None},
+                     cached=False) == "base_plikHM_TT_lowl.covmat"
+
+
+def test_autoselect_covmat_nested_aliases(tmpdir):
+    folder = str(tmpdir)
+    # both names contain lowE, but only the first one contains lowl_lowE too
+    write_covmats(folder, {"base_lowl_lowE": cosmo_params + ["nuisance"],
+                           "base_lowE": cosmo_params})
+    assert best_name([folder], cosmo_params, {"lowl_lowE": {"aliases": ["lowE"]}},
+                     cached=False) == "base_lowl_lowE.covmat"
+
+
+def test_autoselect_covmat_cache(tmpdir, monkeypatch):
+    folder = os.path.join(tmpdir, "covmats")
+    os.mkdir(folder)
+    cache_path = os.path.join(tmpdir, "cache")
+    os.mkdir(cache_path)
+    monkeypatch.setattr(autoselect_covmat, "get_cache_path", lambda: cache_path)
+    monkeypatch.setattr(autoselect_covmat, "_loaded_covmats_database", {})
+    write_covmats(folder, {name: covmats[name] for name in
+                           ["base_plikHM_TT", "base_plikHM_TT_lowl"]})
+    params = cosmo_params + ["mnu"]
+    assert best_name([folder], params, {}) == "base_plikHM_TT_lowl.covmat"
+    assert len(os.listdir(cache_path)) == 1
+
+    # reloaded from the cache file, without reading the covmat files again
+    def no_read(_path):
+        raise AssertionError("covmat database rebuilt")
+
+    with monkeypatch.context() as m:
+        m.setattr(autoselect_covmat, "_loaded_covmats_database", {})
+        m.setattr(autoselect_covmat, "_read_covmat_header_params", no_read)
+        assert best_name([folder], params, {}) == "base_plikHM_TT_lowl.covmat"
+
+    # a new covmat file makes the cached database out of date, so it is rebuilt
+    write_covmats(folder, {"base_mnu_plikHM_TT_lowl": covmats["base_mnu_plikHM_TT_lowl"]})
+    monkeypatch.setattr(autoselect_covmat, "_loaded_covmats_database", {})
+    assert best_name([folder], params, {}) == "base_mnu_plikHM_TT_lowl.covmat"
+    assert len(os.listdir(cache_path)) == 1
+
+
+def test_autoselect_covmat_extra(tmpdir):
+    folder = os.path.join(tmpdir, "covmats")
+    grid_folder = os.path.join(tmpdir, "grid")
+    os.mkdir(folder)
+    os.mkdir(grid_folder)
+    write_covmats(folder, {"base_plikHM_TT_lowl": cosmo_params,
+                           "base_nuisance": ["omegabh2"] + ["nuisance%d" % i for i in
+                                                            range(5)]})
+    write_covmats(grid_folder, {"base_a_1_like1": cosmo_params + ["nuisance0"]})
+    extra_params = {p: {} for p in cosmo_params + ["nuisance%d" % i for i in range(5)]}
+    # package covmats are matched without the likelihood nuisance params
+    assert best_name([folder], cosmo_params, {}, cached=False,
+                     extra_covmats={}, extra_params_info=extra_params) == \
+           "base_plikHM_TT_lowl.covmat"
+    # and additional covmats with them
+    grid_covmats = autoselect_covmat.get_covmat_database([grid_folder], cached=False)
+    assert best_name([folder], cosmo_params, {}, cached=False,
+                     extra_covmats=grid_covmats, extra_params_info=extra_params) == \
+           "base_a_1_like1.covmat"
+    assert best_name([], cosmo_params, {}, extra_covmats=grid_covmats) == \
+           "base_a_1_like1.covmat"
@@ -1,4 +1,6 @@
 import os
+import numpy as np
+import pytest
 from cobaya.yaml import yaml_load_file
 from cobaya import grid_tools
 from cobaya.grid_tools import grid_create, grid_run, grid_converge, grid_tables, \
@@ -73,6 +75,29 @@ def test_grid(tmpdir):
         grid_cleanup([f])
 
 
+def test_grid_covmats(tmpdir):
+    f = os.path.join(tmpdir, 'grid')
+    settings = os.path.join(os.path.dirname(__file__), 'simple_grid.py')
+    grid_create([f, settings])
+
+    def item_covmat(name):
+        return yaml_load_file(
+            os.path.join(f, 'input_files', name + '.yaml'))['sampler']['mcmc']['covmat']
+
+    base_covmat = item_covmat('base_like1')
+    a_1_covmat = item_covmat('base_a_1_like1')
+    with pytest.raises(SystemExit):
+        grid_run([f, '--noqueue', '-1', '--name', 'base_like1'])
+    # one item per CPU; only one to run here
+    grid_run([f, '--noqueue', '0', '--name', 'base_like1'])
+    grid_create([f, settings])
+    assert item_covmat('base_a_2_like1') == os.path.join(
+        f, 'base', 'like1', 'base_like1.covmat')
+    # already-run items, and explicitly given (matrix) covmats, are left as they were
+    assert item_covmat('base_like1') == base_covmat
+    assert np.allclose(item_covmat('base_a_1_like1'), a_1_covmat)
+
+
 def test_cosmo_grid(tmpdir):
     test_name = 'base_w_planck_lowl_NPIPE_TTTEEE_lensing'
     f = os.path.join(tmpdir, 'grid')
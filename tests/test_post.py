@@ -243,3 +243,23 @@ def test_post_params(tmpdir):
                        info_post["post"]["add"]["params"]["c"])
     assert allclose(loaded_samples["my_chi2__target"],
                     products.samples(combined=True)["chi2__target"])
+
+
+def test_post_prior_cut():
+    # Tightening the prior of a sampled parameter drops the samples out of the new
+    # bounds, and reweights the rest by the (uniform) prior density ratio only
+    info: InputDict = {
+        "params": info_params, "sampler": info_sampler_dummy,
+        "likelihood": {"gaussian": sampled_pdf}}
+    updated_info, sampler = run(info)
+    samples_in = sampler.products()["sample"]
+    info_post = {"post": {"suffix": "cut",
+                          "add": {"params": {"a": {"prior": {"min": 0, "max": 2}}}}}}
+    info_post.update(updated_info)
+    _, products = post(info_post, samples_in)
+    samples_out = products.samples(combined=True)
+    kept = samples_in[samples_in["a"] >= 0]
+    assert allclose(samples_out["a"], kept["a"])
+    ratios = (samples_out["weight"].to_numpy(dtype=np.float64) /
+              kept["weight"].to_numpy(dtype=np.float64))
+    assert np.allclose(ratios, ratios[0])